@@ -35,9 +35,12 @@ app.py — シンプル＆クリーンなダッシュボード v3
 """
 
 from __future__ import annotations
-import os, json, sqlite3
+import os, re, copy, json, atexit, sqlite3
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, List, Optional
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
@@ -80,6 +83,25 @@ DEFAULTS = {
     "debug": False
 }
 
+# 雨雲レーダー（Leaflet）の静的コンポーネント
+RADAR_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "radar")
+radar_map = components.declare_component("jma_radar", path=RADAR_COMPONENT_DIR)
+
+@st.cache_data
+def serialize_locations(locations_tuple: Tuple[Tuple[str, float, float, bool], ...]) -> str:
+    """
+    レーダー地図に渡す地点情報をJSON文字列にする
+
+    地点設定が保存されたときだけ作り直す。地図で使う名前・緯度・経度・有効フラグのみを渡す。
+    """
+    return json.dumps([
+        {"name": name, "lat": lat, "lon": lon, "enabled": enabled}
+        for name, lat, lon, enabled in locations_tuple
+    ], ensure_ascii=False)
+
+# ダッシュボード用クエリ結果のキャッシュ有効期間（秒）。モニターの既定収集間隔に合わせる
+QUERY_CACHE_TTL = DEFAULTS["monitoring"]["interval_minutes"] * 60
+
 # ---------- 設定管理 ----------
 def load_config() -> Dict[str, Any]:
     """
@@ -100,36 +122,53 @@ def load_config() -> Dict[str, Any]:
     
     Returns:
         Dict[str, Any]: マージされた設定辞書
+    
+    Note:
+        - 読み込み結果は更新時刻（mtime）をキーにキャッシュされる
+        - 保存により mtime が変わると次回呼び出しで再読み込みされる
     """
-    if os.path.exists(CONFIG_PATH):
+    try:
+        mtime = os.path.getmtime(CONFIG_PATH)
+    except OSError:
+        mtime = None
+    return _load_config_cached(CONFIG_PATH, mtime)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_config_cached(path: str, mtime: Optional[float]) -> Dict[str, Any]:
+    """load_config の実体（mtime はキャッシュキーとしてのみ使用）"""
+    if os.path.exists(path):
         try:
-            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            with open(path, "r", encoding="utf-8") as f:
                 cfg = json.load(f)
         except Exception:
             cfg = {}  # 読み込みエラー時は空の設定で初期化
     else:
         cfg = {}  # 設定ファイルが存在しない場合は空の設定で初期化
     
-    def deep_merge(a, b):
-        for k, v in b.items():
-            if isinstance(v, dict):
-                a[k] = deep_merge(a.get(k, {}), v)
-            elif isinstance(v, list):
-                a.setdefault(k, v)
-            else:
-                a.setdefault(k, v)
-        return a
-    
-    return deep_merge(cfg, DEFAULTS.copy())
+    # 既定値は深いコピーから始める（ネストした辞書・リストを DEFAULTS と共有しない）
+    return _deep_merge(copy.deepcopy(DEFAULTS), cfg)
+
+def _deep_merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """override の値で base を上書きする（辞書同士は再帰的にマージ）"""
+    for k, v in override.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            _deep_merge(base[k], v)
+        else:
+            base[k] = v
+    return base
 
 def save_config(cfg: Dict[str, Any]) -> None:
     with open(CONFIG_PATH, "w", encoding="utf-8") as f:
         json.dump(cfg, f, ensure_ascii=False, indent=2)
 
 # ---------- データベース ----------
-def connect_db(path: str) -> sqlite3.Connection:
+# スキーマ変更時に上げる（PRAGMA user_version と比較して未適用なら _init_schema を実行）
+SCHEMA_VERSION = 3
+
+@st.cache_resource
+def get_rw_conn(path: str) -> sqlite3.Connection:
     """
-    SQLiteデータベースの管理機能
+    SQLiteデータベースの管理機能（書き込み用接続）
     
     テーブル構成:
     1. nowcast: 降水予測データ
@@ -152,12 +191,79 @@ def connect_db(path: str) -> sqlite3.Connection:
         - 自動的にデータベースディレクトリを作成
         - Row型のファクトリを設定（カラム名でアクセス可能）
         - マルチスレッド対応の設定
+        - 接続はプロセス内でキャッシュされ、再実行のたびに開き直さない
+        - 自動コミットモード（isolation_level=None）。複数文の更新は BEGIN IMMEDIATE で囲む
     """
     os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
-    conn = sqlite3.connect(path, check_same_thread=False)
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # カラム名でアクセス可能に
-    
-    # テーブル作成
+
+    # 空きページを少しずつ返却できるようにする（新規DBではWAL化・テーブル作成より前に設定が必要。
+    # 既存DBは「完全再構築」の VACUUM 時にこの設定へ切り替わる）
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+    # WAL: モニターの書き込み中もダッシュボードの読み込みをブロックしない
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    conn.execute("PRAGMA cache_size=-65536")    # 64 MB
+    conn.execute("PRAGMA busy_timeout=5000")
+
+    # スキーマは user_version が古いときだけ作成（作成済みのDBでは CREATE 文を発行しない）
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _init_schema(conn)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    # サーバー終了時に統計情報を更新してから接続を閉じ、WALをチェックポイントさせる
+    atexit.register(_close_rw_conn, conn)
+    return conn
+
+def _close_rw_conn(conn: sqlite3.Connection) -> None:
+    """PRAGMA optimize でクエリプランナーの統計を更新してから接続を閉じる"""
+    try:
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+@st.cache_resource
+def get_ro_conn(path: str) -> sqlite3.Connection:
+    """
+    読み込み専用の接続（画面表示用のクエリはすべてこちらを使う）
+
+    書き込み用接続とページキャッシュを分け、削除や最適化の実行中も表示用の読み込みを妨げない。
+    スキーマ作成とWAL化は get_rw_conn が済ませている前提。
+    """
+    uri = Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    conn.execute("PRAGMA cache_size=-65536")    # 64 MB
+    conn.execute("PRAGMA busy_timeout=5000")
+
+    atexit.register(conn.close)
+    return conn
+
+@contextmanager
+def immediate_transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    BEGIN IMMEDIATE ～ COMMIT（例外時は ROLLBACK）で囲む
+
+    最初に書き込みロックを取るため、モニターの書き込みと競合しても
+    途中のロック昇格で SQLITE_BUSY にならない。get_rw_conn の接続（自動コミットモード）で使う。
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _init_schema(conn: sqlite3.Connection) -> None:
+    """テーブルとインデックスを作成（既存のものはそのまま）"""
     conn.execute("""
     CREATE TABLE IF NOT EXISTS nowcast(
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -172,6 +278,10 @@ def connect_db(path: str) -> sqlite3.Connection:
     )
     """)
     conn.execute("CREATE INDEX IF NOT EXISTS idx_nowcast_point_time ON nowcast(point_name, validtime, lead_min)")
+    # 予測カード用: (point_name, lead_min) で絞り込み validtime 降順で最新行を引く
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_nowcast_point_lead_time ON nowcast(point_name, lead_min, validtime DESC)")
+    # ヘッダーの最新取得時刻用: MAX(created_at) をインデックス末尾の1件で求める
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_nowcast_created ON nowcast(created_at)")
     
     conn.execute("""
     CREATE TABLE IF NOT EXISTS notification_history(
@@ -183,16 +293,26 @@ def connect_db(path: str) -> sqlite3.Connection:
         body TEXT,
         mmph REAL,
         threshold_type TEXT,
-        sent_at TEXT DEFAULT (datetime('now'))
+        sent_at TEXT DEFAULT (datetime('now')),
+        status TEXT DEFAULT 'sent'
     )
     """)
+    # 送信状態（'pending' / 'sent' / 'failed'）の列がない旧DBには追加（既存行は送信済み扱い）
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(notification_history)")}
+    if "status" not in cols:
+        conn.execute("ALTER TABLE notification_history ADD COLUMN status TEXT DEFAULT 'sent'")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_notification_point ON notification_history(point_name, sent_at)")
-    
-    return conn
+    # 通知履歴タブ用: 送信日時のみで範囲検索する
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notification_sent_at ON notification_history(sent_at)")
 
 def fetch_latest_timestamp(conn: sqlite3.Connection) -> Optional[datetime]:
-    """最新のデータ取得時刻をJSTで取得"""
-    row = conn.execute("SELECT MAX(datetime(created_at)) AS ts FROM nowcast").fetchone()
+    """
+    最新のデータ取得時刻をJSTで取得
+
+    時刻列は "YYYY-MM-DD HH:MM:SS" 形式のテキストなので、列を datetime() で
+    包まずにそのまま比較・集計する（包むとインデックスが使われない）。
+    """
+    row = conn.execute("SELECT MAX(created_at) AS ts FROM nowcast").fetchone()
     if row and row["ts"]:
         try:
             # UTCとして読み込んでJSTに変換
@@ -202,37 +322,82 @@ def fetch_latest_timestamp(conn: sqlite3.Connection) -> Optional[datetime]:
             pass
     return None
 
-def fetch_forecast_cards(conn: sqlite3.Connection, point_name: str, leads: List[int]) -> Dict[int, Optional[float]]:
-    """最新の予測値を取得"""
+@st.cache_data(ttl=QUERY_CACHE_TTL, show_spinner=False)
+def fetch_forecast_cards(_conn: sqlite3.Connection, point_name: str, leads: Tuple[int, ...],
+                         data_version: Optional[datetime] = None) -> Dict[int, Optional[float]]:
+    """
+    最新の予測値を取得
+
+    リードごとの最新行を1回のクエリでまとめて取得する。
+    validtime は "YYYY-MM-DD HH:MM:SS" 形式で保存されているため、
+    文字列順がそのまま時刻順になる（datetime() で包まない）。
+
+    data_version には最新データ時刻を渡す。モニターが新しい行を書き込むと
+    キーが変わり、キャッシュが自動的に無効になる。
+    """
     result: Dict[int, Optional[float]] = {m: None for m in leads}
-    
-    for lead in leads:
-        row = conn.execute("""
-            SELECT mmph FROM nowcast 
-            WHERE point_name = ? AND lead_min = ?
-            ORDER BY datetime(validtime) DESC LIMIT 1
-        """, (point_name, lead)).fetchone()
-        
-        if row:
-            result[lead] = float(row["mmph"])
-    
+    if not leads:
+        return result
+
+    placeholders = ",".join("?" * len(leads))
+    rows = _conn.execute(f"""
+        SELECT lead_min, mmph FROM (
+            SELECT lead_min, mmph,
+                   ROW_NUMBER() OVER (PARTITION BY lead_min ORDER BY validtime DESC) AS rn
+            FROM nowcast
+            WHERE point_name = ? AND lead_min IN ({placeholders})
+        )
+        WHERE rn = 1
+    """, (point_name, *leads)).fetchall()
+
+    for row in rows:
+        result[row["lead_min"]] = float(row["mmph"])
+
     return result
 
-def fetch_notification_history(conn: sqlite3.Connection, days: int = 7) -> pd.DataFrame:
-    """通知履歴を取得"""
-    cutoff = (datetime.now(JST) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
-    df = pd.read_sql_query("""
+@st.cache_data(ttl=QUERY_CACHE_TTL, show_spinner=False)
+def fetch_notification_history(_conn: sqlite3.Connection, days: int = 7,
+                               data_version: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    通知履歴を取得（data_version は fetch_forecast_cards と同じくキャッシュキー）
+
+    pd.read_sql_query は内部で中間表現を何段も作るため、カーソルの行を
+    そのまま DataFrame.from_records に渡して一度で変換する。
+    """
+    # sent_at はUTCで保存されているため、基準時刻もSQL側でUTCとして求める
+    cur = _conn.execute("""
         SELECT point_name, notification_type, recipients, subject, 
                mmph, threshold_type, sent_at
         FROM notification_history
-        WHERE datetime(sent_at) >= datetime(?)
-        ORDER BY datetime(sent_at) DESC
-    """, conn, params=(cutoff,))
-    
-    if not df.empty:
-        df["sent_at"] = pd.to_datetime(df["sent_at"])
+        WHERE sent_at >= datetime('now', ?) AND status = 'sent'
+        ORDER BY sent_at DESC
+    """, (f"-{int(days)} days",))
+    columns = [c[0] for c in cur.description]
+    df = pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+    
+    # 型をここで確定させる（sent_at はUTCで保存されているのでJSTへ、mmph は数値）
+    df["sent_at"] = pd.to_datetime(df["sent_at"], utc=True).dt.tz_convert("Asia/Tokyo")
+    df["mmph"] = pd.to_numeric(df["mmph"], errors="coerce").astype("float64")
     return df
 
+@st.cache_data(ttl=5, show_spinner=False)
+def approx_row_counts(_conn: sqlite3.Connection,
+                      data_version: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    nowcast と notification_history の行数を概算（MAX(id) - MIN(id) + 1）
+    （data_version は fetch_forecast_cards と同じくキャッシュキー）
+
+    COUNT(*) は全件走査になるため、主キーの両端だけを引く。
+    古い行から削除する運用なので欠番は少なく、実数とほぼ一致する。
+    2テーブル分を1回のクエリで取得する。
+    """
+    # MAX と MIN は別々のサブクエリにする（同じSELECTに並べると最適化されず全件走査になる）
+    row = _conn.execute("""
+        SELECT (SELECT MAX(id) FROM nowcast) - (SELECT MIN(id) FROM nowcast) + 1,
+               (SELECT MAX(id) FROM notification_history) - (SELECT MIN(id) FROM notification_history) + 1
+    """).fetchone()
+    return row[0] or 0, row[1] or 0
+
 def read_heartbeat() -> Dict[str, Any]:
     hb_path = os.path.join("logs", "monitor_heartbeat.json")
     try:
@@ -241,7 +406,112 @@ def read_heartbeat() -> Dict[str, Any]:
     except Exception:
         return {}
 
+def _tail_bytes(f, n: int, block_size: int = 8192) -> bytes:
+    """
+    バイナリモードで開いたファイルの末尾 n 行をバイト列で返す
+
+    末尾から block_size ずつ読み戻し、n 行分の改行が揃ったところで止める。
+    """
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    buf = b""
+    while pos > 0 and buf.count(b"\n") <= n:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+
+    # 末尾の改行を除いて n 個目の改行を後ろから探し、その直後からを返す
+    cut = len(buf) - 1 if buf.endswith(b"\n") else len(buf)
+    for _ in range(n):
+        cut = buf.rfind(b"\n", 0, cut)
+        if cut < 0:
+            return buf
+    return buf[cut + 1:]
+
+def stat_or_none(path: str) -> Optional[os.stat_result]:
+    """os.stat の結果を返す（ファイルがなければ None）。存在確認とサイズ・更新時刻の取得を1回で済ませる"""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+def tail_lines(path: str, n: int, block_size: int = 8192) -> List[str]:
+    """
+    ファイル末尾の n 行を返す（改行は含まない）
+
+    ログ全体を読み込んで行リストにしない。バイト列のまま行に分け、残す行だけをデコードする
+    （str.splitlines は \x1c や \u2028 でも分割するため、バイト列で分けて行数を改行と一致させる）。
+    """
+    with open(path, "rb") as f:
+        return [line.decode("utf-8", errors="ignore") for line in _tail_bytes(f, n, block_size).splitlines()]
+
+def keep_last_lines(path: str, n: int) -> None:
+    """
+    ファイルを末尾 n 行だけに切り詰める
+
+    同じハンドル（r+b）で末尾を読み、先頭へ書き戻して truncate する。
+    "w" で開き直さないので、書き戻すまでファイルが空になる時間がない。
+    """
+    with open(path, "r+b") as f:
+        tail = _tail_bytes(f, n)
+        f.seek(0)
+        f.write(tail)
+        f.truncate()
+
+# ログ行の種別タグ（1回の正規表現検索で判定し、先頭にアイコンを付ける）
+LOG_TAG_RE = re.compile(r"\[(ERROR|WARN|通知|管理者通知)\]")
+LOG_TAG_PREFIX = {"ERROR": "🔴 ", "WARN": "🟡 ", "通知": "📧 ", "管理者通知": "📧 "}
+
+def format_log_line(line: str) -> str:
+    """エラー/警告/通知の行にアイコンを付ける"""
+    m = LOG_TAG_RE.search(line)
+    return (LOG_TAG_PREFIX[m.group(1)] if m else "") + line.strip()
+
+@st.cache_data(ttl=5, show_spinner=False)
+def read_log_tail(path: str, n: int, mtime_ns: int) -> str:
+    """
+    ログ末尾 n 行を整形して返す
+
+    mtime_ns はキャッシュキー。ファイルが更新されていなければ再実行時に読み直さない。
+    """
+    return "\n".join(format_log_line(line) for line in tail_lines(path, n)) or "(ログなし)"
+
+# ---------- 降水量カード ----------
+RAIN_CARD_TEMPLATE = (
+    "<div class='rain-card {cls}'>"
+    "<div class='rain-time'>{time}</div>"
+    "<div class='rain-value'>{value}</div>"
+    "<div class='rain-unit'>{unit}</div>"
+    "</div>"
+)
+
+def classify_rain_levels(values: np.ndarray, heavy: float, torrential: float) -> np.ndarray:
+    """
+    降水量の配列をカードのクラス名（safe/warn/danger/nodata）に一括変換
+
+    判定は「激しい雨 → 強い雨」の順で、値が NaN（データなし）のものは nodata。
+    """
+    classes = np.select([values >= torrential, values >= heavy], ["danger", "warn"], default="safe")
+    return np.where(np.isnan(values), "nodata", classes)
+
 # ---------- シンプルなスタイル ----------
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "app.css")
+
+@st.cache_resource
+def load_css() -> str:
+    """
+    assets/app.css を一度だけ読み込み、コメントと余分な空白を除いて返す
+
+    CSSは変わらないため、プロセス内で読み込み・整形結果を使い回し、
+    再実行ごとに送るスタイルの量も小さくする。
+    """
+    with open(CSS_PATH, "r", encoding="utf-8") as f:
+        css = f.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", css).strip()
+
 def inject_simple_css():
     """
     Streamlitアプリにカスタムスタイルを注入する
@@ -266,187 +536,7 @@ def inject_simple_css():
        - アニメーション効果
        - フォーカス状態の視覚的フィードバック
     """
-    st.markdown("""
-    <style>
-    /* フォント設定 - システムフォントを優先使用 */
-    html, body, [class*="css"] {
-        font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", "Helvetica Neue", "Hiragino Sans", "Yu Gothic", sans-serif;
-    }
-    
-    /* ヘッダー */
-    .header-container {
-        background: linear-gradient(135deg, #4f46e5 0%, #7c3aed 100%);
-        color: white;
-        padding: 1.5rem;
-        border-radius: 12px;
-        margin-bottom: 1.5rem;
-    }
-    
-    .header-title {
-        font-size: 1.8rem;
-        font-weight: 700;
-        margin-bottom: 0.75rem;
-    }
-    
-    .header-stats {
-        display: flex;
-        gap: 1.5rem;
-        flex-wrap: wrap;
-    }
-    
-    .stat-item {
-        background: rgba(255,255,255,0.15);
-        padding: 0.5rem 1rem;
-        border-radius: 8px;
-        font-size: 0.9rem;
-    }
-    
-    /* 降水量カード - シンプル版 */
-    .rain-card {
-        background: white;
-        border: 1px solid #e5e7eb;
-        border-radius: 12px;
-        padding: 1rem;
-        text-align: center;
-        transition: all 0.2s ease;
-        height: 100%;
-    }
-    
-    .rain-card:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-    }
-    
-    .rain-time {
-        font-size: 0.85rem;
-        color: #6b7280;
-        margin-bottom: 0.5rem;
-        font-weight: 500;
-    }
-    
-    .rain-value {
-        font-size: 1.75rem;
-        font-weight: 700;
-        margin: 0.25rem 0;
-        line-height: 1;
-    }
-    
-    .rain-unit {
-        font-size: 0.8rem;
-        color: #9ca3af;
-    }
-    
-    /* 安全レベル別の色分け */
-    .rain-card.safe {
-        border-color: #10b981;
-        background: #f0fdf4;
-    }
-    .rain-card.safe .rain-value {
-        color: #10b981;
-    }
-    
-    .rain-card.warn {
-        border-color: #f59e0b;
-        background: #fffbeb;
-    }
-    .rain-card.warn .rain-value {
-        color: #f59e0b;
-    }
-    
-    .rain-card.danger {
-        border-color: #ef4444;
-        background: #fef2f2;
-    }
-    .rain-card.danger .rain-value {
-        color: #ef4444;
-    }
-    
-    .rain-card.nodata {
-        border-color: #d1d5db;
-        background: #f9fafb;
-    }
-    .rain-card.nodata .rain-value {
-        color: #9ca3af;
-    }
-    
-    /* 地点セクション */
-    .location-section {
-        background: white;
-        border: 1px solid #e5e7eb;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1.5rem;
-    }
-    
-    .location-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 1rem;
-    }
-    
-    .location-title {
-        font-size: 1.25rem;
-        font-weight: 600;
-        color: #1f2937;
-    }
-    
-    .location-meta {
-        color: #6b7280;
-        font-size: 0.85rem;
-    }
-    
-    /* テーブルスタイル */
-    .simple-table {
-        width: 100%;
-        border-collapse: collapse;
-    }
-    
-    .simple-table th {
-        background: #f9fafb;
-        padding: 0.75rem;
-        text-align: left;
-        font-weight: 600;
-        color: #374151;
-        border-bottom: 1px solid #e5e7eb;
-    }
-    
-    .simple-table td {
-        padding: 0.75rem;
-        border-bottom: 1px solid #f3f4f6;
-    }
-    
-    /* バッジ */
-    .badge {
-        display: inline-block;
-        padding: 0.25rem 0.75rem;
-        border-radius: 9999px;
-        font-size: 0.8rem;
-        font-weight: 500;
-    }
-    
-    .badge.success {
-        background: #d1fae5;
-        color: #065f46;
-    }
-    
-    .badge.warning {
-        background: #fed7aa;
-        color: #92400e;
-    }
-    
-    .badge.error {
-        background: #fee2e2;
-        color: #991b1b;
-    }
-    
-    /* ボタン調整 */
-    .stButton > button {
-        border-radius: 8px;
-        font-weight: 500;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # ---------- メインUI ----------
 
@@ -454,17 +544,32 @@ def inject_simple_css():
 _ = inject_simple_css()
 
 cfg = load_config()
-conn = connect_db(cfg["storage"]["sqlite_path"])
+# 書き込み用（スキーマ作成・削除・最適化）を先に開き、表示用の読み込みは読み込み専用接続で行う
+conn = get_rw_conn(cfg["storage"]["sqlite_path"])
+ro_conn = get_ro_conn(cfg["storage"]["sqlite_path"])
 
-# メタリフレッシュ（60秒）
-_ = st.markdown("<meta http-equiv='refresh' content='60'>", unsafe_allow_html=True)
+# 自動更新（ページ全体の再読み込みではなく、データ更新時だけ再実行する）
+auto_refresh = st.sidebar.toggle("1分ごと自動更新", value=True,
+                                 help="新しいデータが書き込まれたときだけ画面を更新します")
 
 # ---------- ヘッダー ----------
-latest_ts = fetch_latest_timestamp(conn)
+latest_ts = fetch_latest_timestamp(ro_conn)
 hb = read_heartbeat()
 ok = hb.get("ok", False)
 last_run = hb.get("last_run")
 
+# 表示中のデータの版（最新データ時刻とモニターの最終実行時刻）
+st.session_state["data_version"] = (latest_ts, last_run)
+
+@st.fragment(run_every=60 if auto_refresh else None)
+def watch_for_updates():
+    """定期的に版だけを確認し、変化があったときだけアプリ全体を再実行"""
+    current = (fetch_latest_timestamp(ro_conn), read_heartbeat().get("last_run"))
+    if current != st.session_state.get("data_version"):
+        st.rerun()
+
+watch_for_updates()
+
 # JSTで表示
 latest_ts_str = latest_ts.strftime('%Y-%m-%d %H:%M:%S') if latest_ts else '—'
 
@@ -493,159 +598,81 @@ with st.expander("🗾 雨雲レーダー（気象庁 高解像度降水ナウ
     with col2:
         zoom_level = st.slider("ズームレベル", min_value=5, max_value=10, value=8, help="地図の拡大率を調整")
     
-    leaflet_html = f"""
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
-    <div id="map" style="width:100%;height:450px;border-radius:12px;overflow:hidden;border:1px solid #e5e7eb;"></div>
-    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-    <script>
-    (async () => {{
-        const locations = {json.dumps(cfg.get("locations", []))};
-        const center = locations.length > 0 
-            ? [locations[0].lat, locations[0].lon]
-            : [35.0, 137.0];
-        
-        const map = L.map('map', {{
-            zoomControl: true,
-            scrollWheelZoom: true
-        }}).setView(center, {zoom_level});
-        
-        // 地理院地図（淡色）
-        L.tileLayer('https://cyberjapandata.gsi.go.jp/xyz/pale/{{z}}/{{x}}/{{y}}.png', {{
-            maxZoom: 18,
-            attribution: '© GSI Japan'
-        }}).addTo(map);
-        
-        try {{
-            // JMAナウキャストデータ取得
-            const n1 = await fetch('https://www.jma.go.jp/bosai/jmatile/data/nowc/targetTimes_N1.json')
-                .then(r => r.json());
-            
-            let basetime, validtime;
-            if (Array.isArray(n1) && n1.length > 0) {{
-                if (typeof n1[0] === 'string') {{
-                    basetime = n1[0];
-                    validtime = n1[0];
-                }} else if (n1[0].basetime) {{
-                    basetime = n1[0].basetime;
-                    validtime = n1[0].validtime;
-                }}
-            }}
-            
-            if (basetime && validtime) {{
-                // 降水強度レイヤー
-                const jmaUrl = `https://www.jma.go.jp/bosai/jmatile/data/nowc/${{basetime}}/none/${{validtime}}/surf/hrpns/{{z}}/{{x}}/{{y}}.png`;
-                L.tileLayer(jmaUrl, {{
-                    opacity: 0.7,
-                    maxZoom: 15,
-                    attribution: '© JMA'
-                }}).addTo(map);
-            }}
-            
-            // 監視地点をマーカーで表示
-            locations.forEach(loc => {{
-                if (loc.enabled !== false) {{
-                    const marker = L.circleMarker([loc.lat, loc.lon], {{
-                        radius: 8,
-                        fillColor: '#4f46e5',
-                        color: '#fff',
-                        weight: 2,
-                        opacity: 1,
-                        fillOpacity: 0.8
-                    }}).addTo(map);
-                    
-                    marker.bindPopup(`
-                        <div style="min-width:150px">
-                            <b>${{loc.name}}</b><br>
-                            緯度: ${{loc.lat.toFixed(6)}}<br>
-                            経度: ${{loc.lon.toFixed(6)}}
-                        </div>
-                    `);
-                }}
-            }});
-            
-        }} catch(e) {{
-            console.error('JMAデータ取得エラー:', e);
-        }}
-    }})();
-    </script>
-    """
-    components.html(leaflet_html, height=470, scrolling=False)
+    # 地図本体は静的ページ。再実行時はズームと地点だけを送り、地図は作り直さない
+    # 緯度・経度のない地点は地図に出せないので除く（名前は地点設定タブと同じ既定値）
+    locations_json = serialize_locations(tuple(
+        (loc.get("name", "(無名)"), loc["lat"], loc["lon"], loc.get("enabled", True))
+        for loc in cfg.get("locations", [])
+        if loc.get("lat") is not None and loc.get("lon") is not None
+    ))
+    radar_map(zoom=zoom_level, locations=locations_json, key="jma_radar", default=None)
 
 # ---------- タブ ----------
-tabs = st.tabs(["📊 現在の状況", "⚙️ 地点設定", "📧 通知設定", "📜 通知履歴", "🔧 システム管理"])
+# 表示中のタブを追跡し、DB・ファイルを読むタブは開いているときだけ本体を実行する
+tabs = st.tabs(["📊 現在の状況", "⚙️ 地点設定", "📧 通知設定", "📜 通知履歴", "🔧 システム管理"],
+               key="main_tabs", on_change="rerun")
 
 # 📊 現在の状況
-with tabs[0]:
-    leads = cfg.get("leads", [0, 15, 30, 45, 60])
+if tabs[0].open:
+    with tabs[0]:
+        leads = cfg.get("leads", [0, 15, 30, 45, 60])
     
-    # 各地点の表示
-    locations = cfg.get("locations", [])
-    if not locations:
-        st.warning("監視地点が設定されていません。「地点設定」タブから追加してください。")
-    else:
-        for loc in locations:
-            if not loc.get("enabled", True):
-                continue
+        # 各地点の表示
+        locations = cfg.get("locations", [])
+        if not locations:
+            st.warning("監視地点が設定されていません。「地点設定」タブから追加してください。")
+        else:
+            for loc in locations:
+                if not loc.get("enabled", True):
+                    continue
             
-            name = loc.get("name", "(無名)")
-            lat = loc.get("lat", 0)
-            lon = loc.get("lon", 0)
+                name = loc.get("name", "(無名)")
+                lat = loc.get("lat", 0)
+                lon = loc.get("lon", 0)
             
-            # 地点別閾値の取得
-            if loc.get("thresholds"):
-                heavy = loc["thresholds"].get("heavy_rain", 30)
-                torrential = loc["thresholds"].get("torrential_rain", 50)
-            else:
-                heavy = cfg["thresholds"]["heavy_rain"]
-                torrential = cfg["thresholds"]["torrential_rain"]
+                # 地点別閾値の取得
+                if loc.get("thresholds"):
+                    heavy = loc["thresholds"].get("heavy_rain", 30)
+                    torrential = loc["thresholds"].get("torrential_rain", 50)
+                else:
+                    heavy = cfg["thresholds"]["heavy_rain"]
+                    torrential = cfg["thresholds"]["torrential_rain"]
             
-            # 地点セクション
-            with st.container():
-                st.markdown(f"""
-                <div class='location-section'>
-                    <div class='location-header'>
-                        <div class='location-title'>📍 {name}</div>
-                        <div class='location-meta'>
-                            {lat:.6f}, {lon:.6f} | 
-                            閾値: 強い雨 {heavy:.0f}mm/h / 激しい雨 {torrential:.0f}mm/h
+                # 地点セクション
+                with st.container():
+                    st.markdown(f"""
+                    <div class='location-section'>
+                        <div class='location-header'>
+                            <div class='location-title'>📍 {name}</div>
+                            <div class='location-meta'>
+                                {lat:.6f}, {lon:.6f} | 
+                                閾値: 強い雨 {heavy:.0f}mm/h / 激しい雨 {torrential:.0f}mm/h
+                            </div>
                         </div>
                     </div>
-                </div>
-                """, unsafe_allow_html=True)
+                    """, unsafe_allow_html=True)
             
-            # 予測値カード（シンプル版）
-            cols = st.columns(len(leads))
-            cards = fetch_forecast_cards(conn, name, leads)
+                # 予測値カード（地点ごとに1回の st.markdown でまとめて描画）
+                cards = fetch_forecast_cards(ro_conn, name, tuple(leads), latest_ts)
+                values = np.array([np.nan if cards.get(lead) is None else cards[lead] for lead in leads], dtype=float)
+                classes = classify_rain_levels(values, heavy, torrential)
+                card_html = [
+                    RAIN_CARD_TEMPLATE.format(
+                        cls=cls,
+                        time=f"{lead}分後" if lead > 0 else "現在",
+                        value="—" if cls == "nodata" else f"{v:.1f}",
+                        unit="" if cls == "nodata" else "mm/h",
+                    )
+                    for lead, v, cls in zip(leads, values, classes)
+                ]
             
-            for i, lead in enumerate(leads):
-                v = cards.get(lead)
-                
-                if v is None:
-                    cls = "nodata"
-                    time_label = f"{lead}分後" if lead > 0 else "現在"
-                    value_text = "—"
-                    unit = ""
-                else:
-                    if v >= torrential:
-                        cls = "danger"
-                    elif v >= heavy:
-                        cls = "warn"
-                    else:
-                        cls = "safe"
-                    time_label = f"{lead}分後" if lead > 0 else "現在"
-                    value_text = f"{v:.1f}"
-                    unit = "mm/h"
-                
-                with cols[i]:
-                    st.markdown(f"""
-                    <div class='rain-card {cls}'>
-                        <div class='rain-time'>{time_label}</div>
-                        <div class='rain-value'>{value_text}</div>
-                        <div class='rain-unit'>{unit}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                st.markdown(
+                    f"<div class='rain-cards' style='grid-template-columns:repeat({len(leads)},1fr)'>"
+                    f"{''.join(card_html)}</div>",
+                    unsafe_allow_html=True
+                )
             
-            st.markdown("---")
+                st.markdown("---")
 
 # ⚙️ 地点設定
 with tabs[1]:
@@ -801,300 +828,294 @@ with tabs[2]:
             st.rerun()
 
 # 📜 通知履歴
-with tabs[3]:
-    st.header("📜 通知履歴")
-    
-    # フィルター
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        days_filter = st.selectbox("表示期間", options=[1, 3, 7, 14, 30], index=2)
-    with col2:
-        type_filter = st.selectbox("種類", 
-                                   options=["すべて", "降水アラート", "稼働レポート"],
-                                   index=0)
-    with col3:
-        if st.button("🔄 更新", use_container_width=True):
-            st.rerun()
+if tabs[3].open:
+    with tabs[3]:
+        st.header("📜 通知履歴")
     
-    # 履歴データ取得
-    history_df = fetch_notification_history(conn, days=days_filter)
-    
-    if history_df.empty:
-        st.info("通知履歴がありません")
-    else:
-        # フィルタリング
-        if type_filter == "降水アラート":
-            history_df = history_df[history_df["notification_type"] == "threshold_alert"]
-        elif type_filter == "稼働レポート":
-            history_df = history_df[history_df["notification_type"] == "admin_heartbeat"]
-        
-        # 統計
-        col1, col2, col3, col4 = st.columns(4)
+        # フィルター
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("総通知数", len(history_df))
+            days_filter = st.selectbox("表示期間", options=[1, 3, 7, 14, 30], index=2)
         with col2:
-            alert_count = len(history_df[history_df["notification_type"] == "threshold_alert"])
-            st.metric("アラート数", alert_count)
+            type_filter = st.selectbox("種類", 
+                                       options=["すべて", "降水アラート", "稼働レポート"],
+                                       index=0)
         with col3:
-            if not history_df.empty and "mmph" in history_df.columns:
-                max_mmph = history_df["mmph"].max()
-                st.metric("最大降水量", f"{max_mmph:.1f} mm/h" if pd.notna(max_mmph) else "—")
-            else:
-                st.metric("最大降水量", "—")
-        with col4:
-            locations_notified = history_df["point_name"].nunique()
-            st.metric("通知地点数", locations_notified)
+            if st.button("🔄 更新", use_container_width=True):
+                fetch_notification_history.clear()
+                st.rerun()
+    
+        # 履歴データ取得
+        history_df = fetch_notification_history(ro_conn, days_filter, latest_ts)
+    
+        if history_df.empty:
+            st.info("通知履歴がありません")
+        else:
+            # フィルタリング
+            if type_filter == "降水アラート":
+                history_df = history_df[history_df["notification_type"] == "threshold_alert"]
+            elif type_filter == "稼働レポート":
+                history_df = history_df[history_df["notification_type"] == "admin_heartbeat"]
         
-        # 履歴テーブル
-        st.subheader("詳細履歴")
+            # 統計
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("総通知数", len(history_df))
+            with col2:
+                alert_count = int((history_df["notification_type"] == "threshold_alert").sum())
+                st.metric("アラート数", alert_count)
+            with col3:
+                if not history_df.empty and "mmph" in history_df.columns:
+                    max_mmph = history_df["mmph"].max()
+                    st.metric("最大降水量", f"{max_mmph:.1f} mm/h" if pd.notna(max_mmph) else "—")
+                else:
+                    st.metric("最大降水量", "—")
+            with col4:
+                locations_notified = history_df["point_name"].nunique()
+                st.metric("通知地点数", locations_notified)
         
-        # 表示用にフォーマット
-        display_df = history_df.copy()
+            # 履歴テーブル
+            st.subheader("詳細履歴")
         
-        # JSTとして表示
-        display_df["sent_at"] = pd.to_datetime(display_df["sent_at"]).dt.tz_localize('UTC').dt.tz_convert('Asia/Tokyo')
-        display_df["sent_at"] = display_df["sent_at"].dt.strftime("%Y-%m-%d %H:%M")
+            # 表示用にフォーマット
+            display_df = history_df.copy()
         
-        display_df["mmph"] = display_df["mmph"].apply(lambda x: f"{x:.1f}" if pd.notna(x) else "—")
+            # sent_at は取得時にJSTの datetime 型へ変換済み（書式は column_config で指定）
         
-        # タイプを日本語に変換
-        type_map = {
-            "threshold_alert": "降水アラート",
-            "admin_heartbeat": "稼働レポート"
-        }
-        display_df["notification_type"] = display_df["notification_type"].map(type_map).fillna("その他")
+            # タイプを日本語に変換
+            type_map = {
+                "threshold_alert": "降水アラート",
+                "admin_heartbeat": "稼働レポート"
+            }
+            display_df["notification_type"] = display_df["notification_type"].map(type_map, na_action="ignore").fillna("その他")
         
-        # 閾値タイプを日本語に
-        threshold_map = {
-            "heavy": "強い雨",
-            "torrential": "激しい雨"
-        }
-        if "threshold_type" in display_df.columns:
-            display_df["threshold_type"] = display_df["threshold_type"].map(threshold_map).fillna("—")
+            # 閾値タイプを日本語に
+            threshold_map = {
+                "heavy": "強い雨",
+                "torrential": "激しい雨"
+            }
+            if "threshold_type" in display_df.columns:
+                display_df["threshold_type"] = display_df["threshold_type"].map(threshold_map, na_action="ignore").fillna("—")
         
-        # カラム名を日本語に
-        display_df = display_df.rename(columns={
-            "sent_at": "送信日時",
-            "point_name": "地点",
-            "notification_type": "種類",
-            "threshold_type": "レベル",
-            "mmph": "降水量(mm/h)",
-            "recipients": "送信先"
-        })
+            # カラム名を日本語に
+            display_df = display_df.rename(columns={
+                "sent_at": "送信日時",
+                "point_name": "地点",
+                "notification_type": "種類",
+                "threshold_type": "レベル",
+                "mmph": "降水量(mm/h)",
+                "recipients": "送信先"
+            })
         
-        # 表示カラムを選択
-        display_cols = ["送信日時", "地点", "種類", "レベル", "降水量(mm/h)", "送信先"]
-        display_cols = [col for col in display_cols if col in display_df.columns]
+            # 表示カラムを選択
+            display_cols = ["送信日時", "地点", "種類", "レベル", "降水量(mm/h)", "送信先"]
+            display_cols = [col for col in display_cols if col in display_df.columns]
         
-        st.dataframe(
-            display_df[display_cols],
-            use_container_width=True,
-            hide_index=True,
-            height=400
-        )
+            st.dataframe(
+                display_df[display_cols],
+                use_container_width=True,
+                hide_index=True,
+                height=400,
+                column_config={
+                    "送信日時": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm"),
+                    "降水量(mm/h)": st.column_config.NumberColumn(format="%.1f"),
+                }
+            )
 
 # 🔧 システム管理
-with tabs[4]:
-    st.header("🔧 システム管理")
+if tabs[4].open:
+    with tabs[4]:
+        st.header("🔧 システム管理")
+
+        # ログファイルの状態はここで1回だけ取得し、クリア・表示・ダウンロードで使い回す
+        log_file = os.path.join("logs", "monitor.log")
+        log_stat = stat_or_none(log_file)
     
-    # システム状態
-    col1, col2 = st.columns(2)
+        # システム状態
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.subheader("システム状態")
-        hb = read_heartbeat()
+        with col1:
+            st.subheader("システム状態")
+            hb = read_heartbeat()
         
-        if hb.get("ok"):
-            st.success("✅ システムは正常に稼働しています")
-        else:
-            st.warning("⚠️ システムに問題がある可能性があります")
+            if hb.get("ok"):
+                st.success("✅ システムは正常に稼働しています")
+            else:
+                st.warning("⚠️ システムに問題がある可能性があります")
         
-        st.metric("最終実行", hb.get("last_run", "—"))
-        st.metric("状態", "正常" if hb.get("ok") else "異常")
-        if hb.get("error"):
-            st.error(f"エラー: {hb['error']}")
+            st.metric("最終実行", hb.get("last_run", "—"))
+            st.metric("状態", "正常" if hb.get("ok") else "異常")
+            if hb.get("error"):
+                st.error(f"エラー: {hb['error']}")
     
-    with col2:
-        st.subheader("データベース情報")
+        with col2:
+            st.subheader("データベース情報")
+        
+            # データ件数・通知件数（概算、1クエリ）
+            data_count, noti_count = approx_row_counts(ro_conn, latest_ts)
+            st.metric("観測データ数（概算）", f"{data_count:,}")
+            st.metric("通知履歴数（概算）", f"{noti_count:,}")
         
-        with conn:
-            # データ件数
-            data_count = conn.execute("SELECT COUNT(*) FROM nowcast").fetchone()[0]
-            st.metric("観測データ数", f"{data_count:,}")
-            
-            # 通知件数
-            noti_count = conn.execute("SELECT COUNT(*) FROM notification_history").fetchone()[0]
-            st.metric("通知履歴数", f"{noti_count:,}")
-            
             # ストレージサイズ
-            if os.path.exists(cfg["storage"]["sqlite_path"]):
-                size_mb = os.path.getsize(cfg["storage"]["sqlite_path"]) / (1024 * 1024)
+            db_stat = stat_or_none(cfg["storage"]["sqlite_path"])
+            if db_stat is not None:
+                size_mb = db_stat.st_size / (1024 * 1024)
                 st.metric("DBサイズ", f"{size_mb:.2f} MB")
     
-    st.divider()
+        st.divider()
     
-    # システム設定
-    st.subheader("システム設定")
+        # システム設定
+        st.subheader("システム設定")
     
-    with st.form("system_settings", clear_on_submit=False):
-        col1, col2 = st.columns(2)
+        with st.form("system_settings", clear_on_submit=False):
+            col1, col2 = st.columns(2)
         
-        with col1:
-            monitoring_enabled = st.checkbox(
-                "監視を有効にする",
-                value=cfg["monitoring"]["enabled"]
-            )
+            with col1:
+                monitoring_enabled = st.checkbox(
+                    "監視を有効にする",
+                    value=cfg["monitoring"]["enabled"]
+                )
             
-            interval = st.number_input(
-                "データ収集間隔（分）",
-                min_value=1,
-                max_value=60,
-                value=cfg["monitoring"]["interval_minutes"],
-                help="気象データの更新頻度"
-            )
+                interval = st.number_input(
+                    "データ収集間隔（分）",
+                    min_value=1,
+                    max_value=60,
+                    value=cfg["monitoring"]["interval_minutes"],
+                    help="気象データの更新頻度"
+                )
             
-            leads = st.multiselect(
-                "予測時間（分後）",
-                options=[0, 15, 30, 45, 60, 75, 90],
-                default=cfg.get("leads", [0, 15, 30, 45, 60]),
-                help="表示する予測時間"
-            )
+                leads = st.multiselect(
+                    "予測時間（分後）",
+                    options=[0, 15, 30, 45, 60, 75, 90],
+                    default=cfg.get("leads", [0, 15, 30, 45, 60]),
+                    help="表示する予測時間"
+                )
         
-        with col2:
-            retention = st.number_input(
-                "データ保持期間（日）",
-                min_value=1,
-                max_value=365,
-                value=cfg["storage"]["retention_days"],
-                help="古いデータの自動削除"
-            )
+            with col2:
+                retention = st.number_input(
+                    "データ保持期間（日）",
+                    min_value=1,
+                    max_value=365,
+                    value=cfg["storage"]["retention_days"],
+                    help="古いデータの自動削除"
+                )
             
-            debug_mode = st.checkbox(
-                "デバッグモード",
-                value=cfg.get("debug", False),
-                help="詳細なログを出力"
-            )
+                debug_mode = st.checkbox(
+                    "デバッグモード",
+                    value=cfg.get("debug", False),
+                    help="詳細なログを出力"
+                )
             
-            suppress_warn = st.checkbox(
-                "警告を抑制",
-                value=cfg["log"].get("suppress_warn", True),
-                help="ログの警告メッセージを減らす"
-            )
+                suppress_warn = st.checkbox(
+                    "警告を抑制",
+                    value=cfg["log"].get("suppress_warn", True),
+                    help="ログの警告メッセージを減らす"
+                )
         
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            if st.form_submit_button("💾 システム設定を保存", use_container_width=True, type="primary"):
-                cfg["monitoring"]["enabled"] = monitoring_enabled
-                cfg["monitoring"]["interval_minutes"] = interval
-                cfg["leads"] = sorted(leads)
-                cfg["storage"]["retention_days"] = retention
-                cfg["debug"] = debug_mode
-                cfg["log"]["suppress_warn"] = suppress_warn
-                save_config(cfg)
-                st.success("✅ システム設定を保存しました")
-                st.rerun()
-    
-    st.divider()
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                if st.form_submit_button("💾 システム設定を保存", use_container_width=True, type="primary"):
+                    cfg["monitoring"]["enabled"] = monitoring_enabled
+                    cfg["monitoring"]["interval_minutes"] = interval
+                    cfg["leads"] = sorted(leads)
+                    cfg["storage"]["retention_days"] = retention
+                    cfg["debug"] = debug_mode
+                    cfg["log"]["suppress_warn"] = suppress_warn
+                    save_config(cfg)
+                    st.success("✅ システム設定を保存しました")
+                    st.rerun()
+    
+        st.divider()
+    
+        # データ管理
+        st.subheader("データ管理")
+    
+        col1, col2, col3 = st.columns(3)
     
-    # データ管理
-    st.subheader("データ管理")
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if st.button("🗑️ 古いデータを削除", use_container_width=True):
-            try:
-                days = cfg["storage"]["retention_days"]
-                cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        with col1:
+            if st.button("🗑️ 古いデータを削除", use_container_width=True):
+                try:
+                    days = cfg["storage"]["retention_days"]
+                    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
                 
-                with conn:
-                    # 削除前のカウント
-                    before_nowcast = conn.execute("SELECT COUNT(*) FROM nowcast").fetchone()[0]
-                    before_history = conn.execute("SELECT COUNT(*) FROM notification_history").fetchone()[0]
-                    
-                    # 削除実行
-                    conn.execute("DELETE FROM nowcast WHERE datetime(validtime) < datetime(?)", (cutoff,))
-                    conn.execute("DELETE FROM notification_history WHERE datetime(sent_at) < datetime(?)", (cutoff,))
-                    conn.commit()
-                    
-                    # 削除後のカウント
-                    after_nowcast = conn.execute("SELECT COUNT(*) FROM nowcast").fetchone()[0]
-                    after_history = conn.execute("SELECT COUNT(*) FROM notification_history").fetchone()[0]
-                    
-                    deleted_nowcast = before_nowcast - after_nowcast
-                    deleted_history = before_history - after_history
-                    
-                st.success(f"削除完了: 観測データ {deleted_nowcast}件, 通知履歴 {deleted_history}件")
-            except Exception as e:
-                st.error(f"削除エラー: {e}")
+                    # 1トランザクションで削除し、件数は DELETE の rowcount から得る（COUNT(*) の全件走査をしない）
+                    with immediate_transaction(conn):
+                        deleted_nowcast = conn.execute("DELETE FROM nowcast WHERE validtime < ?", (cutoff,)).rowcount
+                        # sent_at はUTCで保存されているため、基準時刻もSQL側でUTCとして求める
+                        deleted_history = conn.execute("DELETE FROM notification_history WHERE sent_at < datetime('now', ?)",
+                                                       (f"-{int(days)} days",)).rowcount
+                
+                    # auto_vacuum=INCREMENTAL のDBなら空きページをファイルから返却
+                    # （execute では1ページ分しか進まないため executescript で最後まで実行）
+                    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                        conn.executescript("PRAGMA incremental_vacuum;")
+                
+                    fetch_forecast_cards.clear()
+                    fetch_notification_history.clear()
+                    approx_row_counts.clear()
+                    st.success(f"削除完了: 観測データ {deleted_nowcast}件, 通知履歴 {deleted_history}件")
+                except Exception as e:
+                    st.error(f"削除エラー: {e}")
     
-    with col2:
-        if st.button("🔄 データベース最適化", use_container_width=True):
-            try:
-                with conn:
+        with col2:
+            if st.button("🔄 データベース最適化", use_container_width=True):
+                try:
+                    # 空きページを最大500ページ返却し、統計情報を必要な分だけ更新（ファイル全体は書き直さない）
+                    conn.executescript("PRAGMA incremental_vacuum(500); PRAGMA optimize;")
+                    st.success("データベースを最適化しました")
+                except Exception as e:
+                    st.error(f"最適化エラー: {e}")
+
+            # 完全再構築（VACUUM）はファイル全体を書き直すため、確認してから実行
+            confirm_vacuum = st.checkbox("完全再構築を実行する", value=False,
+                                         help="DBファイル全体を書き直します。実行中はモニターの書き込みが待たされます")
+            if st.button("🧱 完全再構築", use_container_width=True, disabled=not confirm_vacuum):
+                try:
                     conn.execute("VACUUM")
-                st.success("データベースを最適化しました")
-            except Exception as e:
-                st.error(f"最適化エラー: {e}")
+                    st.success("データベースを再構築しました")
+                except Exception as e:
+                    st.error(f"再構築エラー: {e}")
     
-    with col3:
-        if st.button("📋 ログをクリア", use_container_width=True):
-            try:
-                log_file = os.path.join("logs", "monitor.log")
-                if os.path.exists(log_file):
-                    # 最新100行を残す
-                    with open(log_file, "r", encoding="utf-8", errors="ignore") as f:
-                        lines = f.readlines()
-                    
-                    with open(log_file, "w", encoding="utf-8") as f:
-                        f.writelines(lines[-100:] if len(lines) > 100 else lines)
+        with col3:
+            if st.button("📋 ログをクリア", use_container_width=True):
+                try:
+                    if log_stat is not None:
+                        # 最新100行を残す（末尾だけを読み、同じファイル内で切り詰める）
+                        keep_last_lines(log_file, 100)
+                        log_stat = os.stat(log_file)
                     
-                    st.success("古いログをクリアしました（最新100行を保持）")
-                else:
-                    st.info("ログファイルがありません")
-            except Exception as e:
-                st.error(f"クリアエラー: {e}")
-    
-    st.divider()
-    
-    # ログ表示
-    st.subheader("📋 システムログ（最新50行）")
-    
-    log_file = os.path.join("logs", "monitor.log")
-    if os.path.exists(log_file):
-        try:
-            with open(log_file, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()[-50:]
-                
-                # エラー/警告をハイライト
-                formatted_lines = []
-                for line in lines:
-                    if "[ERROR]" in line:
-                        formatted_lines.append(f"🔴 {line.strip()}")
-                    elif "[WARN]" in line:
-                        formatted_lines.append(f"🟡 {line.strip()}")
-                    elif "[通知]" in line or "[管理者通知]" in line:
-                        formatted_lines.append(f"📧 {line.strip()}")
+                        st.success("古いログをクリアしました（最新100行を保持）")
                     else:
-                        formatted_lines.append(line.strip())
-                
-                log_text = "\n".join(formatted_lines) if formatted_lines else "(ログなし)"
-        except Exception:
-            log_text = "(ログ読み込みエラー)"
-    else:
-        log_text = "(ログファイルなし)"
-    
-    st.text_area("", value=log_text, height=300, disabled=True, label_visibility="collapsed")
-    
-    # 詳細ログダウンロード
-    if os.path.exists(log_file):
-        with open(log_file, "rb") as f:
-            st.download_button(
-                label="📥 完全なログをダウンロード",
-                data=f,
-                file_name=f"monitor_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                mime="text/plain"
-            )
+                        st.info("ログファイルがありません")
+                except Exception as e:
+                    st.error(f"クリアエラー: {e}")
+    
+        st.divider()
+    
+        # ログ表示（開いているときだけログを読み込む）
+        log_expander = st.expander("📋 システムログ（最新50行）", expanded=False,
+                                   key="log_expander", on_change="rerun")
+        if log_expander.open:
+            with log_expander:
+                if log_stat is not None:
+                    try:
+                        # エラー/警告をハイライト（更新がなければキャッシュを使う）
+                        log_text = read_log_tail(log_file, 50, log_stat.st_mtime_ns)
+                    except Exception:
+                        log_text = "(ログ読み込みエラー)"
+                else:
+                    log_text = "(ログファイルなし)"
+            
+                st.text_area("", value=log_text, height=300, disabled=True, label_visibility="collapsed")
+            
+                # 詳細ログダウンロード（ファイルはボタンが押されたときだけ読む）
+                if log_stat is not None:
+                    st.download_button(
+                        label="📥 完全なログをダウンロード",
+                        data=lambda: Path(log_file).read_bytes(),
+                        file_name=f"monitor_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                        mime="text/plain"
+                    )
 
 # ---------- フッター ----------
 st.markdown("---")
@@ -44,10 +44,12 @@ monitor.py – 改善版：正確な予測ロジック＆地点別メール通
    - プロセス管理: logs/monitor.pid
 """
 
-import os, sys, json, time, math, sqlite3, atexit, signal, argparse
+import os, sys, copy, json, time, math, queue, bisect, asyncio, sqlite3, atexit, signal, argparse, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from io import BytesIO
-from typing import Dict, Any, Tuple, Optional, List, Set
+from typing import Dict, Any, Tuple, Optional, List, Set, Iterable
 
 # 依存
 try:
@@ -58,15 +60,24 @@ try:
     except Exception:
         Retry = None
     from PIL import Image
+    import numpy as np
 except Exception as e:
     print("[ERROR] 必要なパッケージがありません。次を実行してください:", file=sys.stderr)
-    print("  python -m pip install requests pillow", file=sys.stderr)
+    print("  python -m pip install requests pillow numpy", file=sys.stderr)
     raise
 
+# 任意: numba があればタイル解析の内側ループをJITコンパイル
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+
 # Windows Outlook
 try:
     import win32com.client
     import pythoncom
+    import pywintypes
     WINDOWS_EMAIL = True
 except Exception:
     WINDOWS_EMAIL = False
@@ -151,8 +162,8 @@ STEP_TO_MM_IDENTITY.update({  # 61-65は特殊な強度値
     65: 300   # 記録的な雨
 })
 
-def convert_step_to_mmh_jma_bins(step: int) -> float:
-    if not isinstance(step, int) or step <= 0: return 0.0
+def _step_to_bin(step: int) -> float:
+    """ステップ値→降水量→JMAの階級代表値"""
     m = float(STEP_TO_MM_IDENTITY.get(step, 0.0))
     if m <= 0.0:  return 0.0
     if m <= 1.0:  return 1.0
@@ -164,6 +175,13 @@ def convert_step_to_mmh_jma_bins(step: int) -> float:
     if m <= 80.0: return 80.0
     return m
 
+# ステップ値（パレット番号 0-255）→階級代表値の表（起動時に1回だけ作成）
+STEP_TO_BIN = np.array([_step_to_bin(step) for step in range(256)], dtype=np.float64)
+
+def convert_step_to_mmh_jma_bins(step: int) -> float:
+    if not isinstance(step, int) or not 0 < step < len(STEP_TO_BIN): return 0.0
+    return float(STEP_TO_BIN[step])
+
 JMA_COLOR_BINS = {
     (242,242,255): 1.0,
     (160,210,255): 5.0,
@@ -175,17 +193,73 @@ JMA_COLOR_BINS = {
     (180,0,104):   80.0,
 }
 
-def near_color_to_mmh(r:int, g:int, b:int, tol:int=2) -> Optional[float]:
+COLOR_LUT_TOL = 2
+
+def _build_color_lut(tol: int) -> Dict[int, float]:
+    """許容誤差内のRGBを (r<<16)|(g<<8)|b で引ける表を作成（色が重なる場合は先の色を優先）"""
+    lut: Dict[int, float] = {}
+    for (cr,cg,cb), rep in JMA_COLOR_BINS.items():
+        for r in range(max(0, cr-tol), min(255, cr+tol) + 1):
+            for g in range(max(0, cg-tol), min(255, cg+tol) + 1):
+                for b in range(max(0, cb-tol), min(255, cb+tol) + 1):
+                    lut.setdefault((r << 16) | (g << 8) | b, float(rep))
+    return lut
+
+COLOR_LUT = _build_color_lut(COLOR_LUT_TOL)
+
+def near_color_to_mmh(r:int, g:int, b:int, tol:int=COLOR_LUT_TOL) -> Optional[float]:
+    if tol == COLOR_LUT_TOL:
+        return COLOR_LUT.get((r << 16) | (g << 8) | b)
     for (cr,cg,cb), rep in JMA_COLOR_BINS.items():
         if abs(r-cr)<=tol and abs(g-cg)<=tol and abs(b-cb)<=tol:
             return float(rep)
     return None
 
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _palette_window_max(alpha: np.ndarray, idx: np.ndarray) -> int:
+        """窓内で不透明な画素のパレット番号の最大値（JITコンパイル版）"""
+        m = 0
+        for y in range(alpha.shape[0]):
+            for x in range(alpha.shape[1]):
+                if alpha[y, x] > 0 and idx[y, x] > m:
+                    m = idx[y, x]
+        return m
+else:
+    def _palette_window_max(alpha: np.ndarray, idx: np.ndarray) -> int:
+        """窓内で不透明な画素のパレット番号の最大値"""
+        return np.where(alpha > 0, idx, 0).max()
+
 # ───────── データベース管理 ─────────
+_CONNS: Dict[str, sqlite3.Connection] = {}
+
+def _get_conn(path: str) -> sqlite3.Connection:
+    """
+    パスごとに1つの接続を開いて使い回す（常駐中は開きっぱなし、終了時に閉じる）
+    
+    WAL: ダッシュボードの読み込み中も書き込みがブロックされない
+    synchronous=NORMAL: WALではコミットごとの fsync を省いても整合性は保たれる
+    """
+    con = _CONNS.get(path)
+    if con is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
+        # 収集スレッドはサイクルごとに変わり、終了時の close はメインスレッドから呼ばれる
+        # （同時に使うのは常に1スレッドだけ）
+        con = sqlite3.connect(path, check_same_thread=False)
+        # 空きページを少しずつ返却できるようにする（新規DBではWAL化・テーブル作成より前に設定が必要）
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute("PRAGMA busy_timeout=5000")
+        atexit.register(con.close)
+        _CONNS[path] = con
+    return con
+
 def ensure_db(path: str):
     """データベースとテーブルを初期化"""
-    os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
-    with sqlite3.connect(path) as con:
+    con = _get_conn(path)
+    with con:
         # 既存のnowcastテーブル
         con.execute("""
         CREATE TABLE IF NOT EXISTS nowcast(
@@ -200,6 +274,9 @@ def ensure_db(path: str):
         )
         """)
         con.execute("CREATE INDEX IF NOT EXISTS idx_nowcast_point_time ON nowcast(point_name, validtime, lead_min)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_nowcast_point_lead_time ON nowcast(point_name, lead_min, validtime DESC)")
+        # 定期レポートの直近1時間集計用（created_at の範囲検索）
+        con.execute("CREATE INDEX IF NOT EXISTS idx_nowcast_created ON nowcast(created_at)")
         
         # 新規：通知履歴テーブル
         con.execute("""
@@ -212,56 +289,83 @@ def ensure_db(path: str):
             body TEXT,
             mmph REAL,
             threshold_type TEXT,     -- 'heavy' or 'torrential'
-            sent_at TEXT DEFAULT (datetime('now'))
+            sent_at TEXT DEFAULT (datetime('now')),
+            status TEXT DEFAULT 'sent'  -- 'pending'（送信待ち）/ 'sent' / 'failed'
         )
         """)
+        # 送信状態の列がない旧DBには追加（既存行は送信済み扱い）
+        cols = {row[1] for row in con.execute("PRAGMA table_info(notification_history)")}
+        if "status" not in cols:
+            con.execute("ALTER TABLE notification_history ADD COLUMN status TEXT DEFAULT 'sent'")
         con.execute("CREATE INDEX IF NOT EXISTS idx_notification_point ON notification_history(point_name, sent_at)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_notification_sent_at ON notification_history(sent_at)")
 
 def save_notification_history(path: str, point_name: str, noti_type: str, 
                             recipients: str, subject: str, body: str,
-                            mmph: float = None, threshold_type: str = None):
-    """通知履歴を保存"""
-    with sqlite3.connect(path) as con:
-        con.execute("""
+                            mmph: float = None, threshold_type: str = None,
+                            status: str = "sent") -> int:
+    """通知履歴を保存して行IDを返す"""
+    with _get_conn(path) as con:
+        cur = con.execute("""
             INSERT INTO notification_history(point_name, notification_type, recipients, 
-                                           subject, body, mmph, threshold_type)
-            VALUES(?,?,?,?,?,?,?)
-        """, (point_name, noti_type, recipients, subject, body, mmph, threshold_type))
-        con.commit()
+                                           subject, body, mmph, threshold_type, status)
+            VALUES(?,?,?,?,?,?,?,?)
+        """, (point_name, noti_type, recipients, subject, body, mmph, threshold_type, status))
+        return cur.lastrowid
 
-def check_recent_notification(path: str, point_name: str, cooldown_minutes: int) -> bool:
-    """指定時間内に同一地点への通知があったかチェック"""
-    with sqlite3.connect(path) as con:
-        cutoff = (datetime.now() - timedelta(minutes=cooldown_minutes)).strftime("%Y-%m-%d %H:%M:%S")
-        cur = con.execute("""
-            SELECT COUNT(*) as cnt FROM notification_history 
-            WHERE point_name = ? AND notification_type = 'threshold_alert' 
-                  AND datetime(sent_at) > datetime(?)
-        """, (point_name, cutoff))
-        return cur.fetchone()[0] > 0
+def mark_notification_status(path: str, row_id: int, sent: bool):
+    """
+    送信待ちの通知履歴を送信済み（送信時刻も更新）または送信失敗にする
+    
+    メール送信スレッドから呼ばれるため、共有接続は使わずにその場で接続する
+    """
+    con = sqlite3.connect(path)
+    try:
+        con.execute("PRAGMA busy_timeout=5000")
+        with con:
+            if sent:
+                con.execute("UPDATE notification_history SET status = 'sent', sent_at = datetime('now') "
+                            "WHERE id = ?", (row_id,))
+            else:
+                con.execute("UPDATE notification_history SET status = 'failed' WHERE id = ?", (row_id,))
+    finally:
+        con.close()
+
+def recent_notification_points(path: str, cooldown_minutes: int) -> Set[str]:
+    """指定時間内にアラートを送信済みの地点名をまとめて取得（sent_at はUTCのためSQL側で比較）"""
+    con = _get_conn(path)
+    cur = con.execute("""
+        SELECT DISTINCT point_name FROM notification_history 
+        WHERE notification_type = 'threshold_alert' AND status = 'sent'
+              AND sent_at > datetime('now', ?)
+    """, (f'-{int(cooldown_minutes)} minutes',))
+    return {row[0] for row in cur}
 
 def purge_old_rows(path: str, keep_days: int):
     """古いデータを削除"""
-    with sqlite3.connect(path) as con:
-        con.execute("DELETE FROM nowcast WHERE datetime(validtime) < datetime('now', ?)",
+    with _get_conn(path) as con:
+        con.execute("DELETE FROM nowcast WHERE validtime < datetime('now', ?)",
                    (f'-{int(keep_days)} days',))
-        con.execute("DELETE FROM notification_history WHERE datetime(sent_at) < datetime('now', ?)",
+        con.execute("DELETE FROM notification_history WHERE sent_at < datetime('now', ?)",
                    (f'-{int(keep_days * 2)} days',))  # 通知履歴は2倍の期間保持
-        con.commit()
 
-def save_nowcast(path: str, point_name: str, lat: float, lon: float,
-                basetime_utc: str, validtime_utc: str, lead_min: int, mmph: float):
-    """観測データを保存"""
+def nowcast_row(point_name: str, lat: float, lon: float,
+                basetime_utc: str, validtime_utc: str, lead_min: int, mmph: float) -> Tuple:
+    """nowcast テーブル1行分の値（validtime はJSTの "YYYY-MM-DD HH:MM:SS" に変換）"""
     vt_utc = datetime.strptime(validtime_utc, "%Y%m%d%H%M%S")
     vt_jst = vt_utc + timedelta(hours=9)
     vt_iso = vt_jst.strftime("%Y-%m-%d %H:%M:%S")
-    
-    with sqlite3.connect(path) as con:
-        con.execute("""
+    return (point_name, lat, lon, basetime_utc, vt_iso, int(lead_min), float(mmph))
+
+def save_nowcast(path: str, rows: List[Tuple]) -> None:
+    """観測データをまとめて保存（1トランザクション・1回のコミット）"""
+    if not rows:
+        return
+    with _get_conn(path) as con:
+        con.executemany("""
             INSERT INTO nowcast(point_name,lat,lon,basetime,validtime,lead_min,mmph)
             VALUES(?,?,?,?,?,?,?)
-        """, (point_name, lat, lon, basetime_utc, vt_iso, int(lead_min), float(mmph)))
-        con.commit()
+        """, rows)
 
 # ───────── Windows Outlook メール送信 ─────────
 class OutlookMailer:
@@ -271,6 +375,26 @@ class OutlookMailer:
         if not WINDOWS_EMAIL:
             raise RuntimeError("Windows Outlook機能は利用できません")
         self.importance = importance
+        # Outlook.Application のプロキシは作成したスレッドでのみ使えるため、スレッドと組で保持
+        self._outlook = None
+        self._outlook_thread: Optional[int] = None
+    
+    def _get_outlook(self):
+        """Outlook.Application を一度だけ Dispatch して使い回す（初回・別スレッド・切断後のみ作り直す）"""
+        tid = threading.get_ident()
+        if self._outlook is None or self._outlook_thread != tid:
+            pythoncom.CoInitialize()
+            self._outlook = win32com.client.Dispatch("Outlook.Application")
+            self._outlook_thread = tid
+        return self._outlook
+    
+    def _create_mail(self):
+        try:
+            return self._get_outlook().CreateItem(0)  # 0 = Mail Item
+        except pywintypes.com_error:
+            # Outlook の再起動などでプロキシが無効になった場合は一度だけ接続し直す
+            self._outlook = None
+            return self._get_outlook().CreateItem(0)
         
     def send(self, to_addresses: str, subject: str, body: str, is_html: bool = False) -> bool:
         """
@@ -284,9 +408,7 @@ class OutlookMailer:
             送信成功時True
         """
         try:
-            pythoncom.CoInitialize()
-            outlook = win32com.client.Dispatch("Outlook.Application")
-            mail = outlook.CreateItem(0)  # 0 = Mail Item
+            mail = self._create_mail()
             
             mail.To = to_addresses.replace(",", ";")  # Outlookはセミコロン区切り
             mail.Subject = subject
@@ -305,15 +427,10 @@ class OutlookMailer:
                 mail.Importance = 1
                 
             mail.Send()
-            pythoncom.CoUninitialize()
             return True
             
         except Exception as e:
             log_message(f"[ERROR] Outlookメール送信失敗: {e}")
-            try:
-                pythoncom.CoUninitialize()
-            except:
-                pass
             return False
 
 # ───────── 通知管理 ─────────
@@ -356,21 +473,109 @@ class NotificationManager:
         cfg (Dict[str, Any]): システム設定
         db_path (str): データベースファイルパス
         mailer (Optional[OutlookMailer]): メール送信クライアント
+    
+    メールは送信キューに積み、専用スレッドが順に送信する（収集ループは送信完了を待たない）。
+    通知履歴はキューに積む前に送信待ちとして保存し、送信後に送信済み／失敗へ更新する
+    （クールダウンは送信済みの履歴だけで判定）。
     """
     
+    MAIL_DRAIN_TIMEOUT = 120  # 終了時に送信待ちのメールを待つ最大秒数
+    
     def __init__(self, cfg: Dict[str, Any], db_path: str):
         self.cfg = cfg
         self.db_path = db_path
-        self.mailer = None
-        
+        self.mailer = self._create_mailer(cfg)
+        # このプロセスで最後に定期レポートを送った時刻（送信済み判定でDBを見ずに済ませる）
+        self._last_heartbeat_sent: Optional[datetime] = None
+        # (mailer, 宛先, 件名, 本文, 履歴ID, 通知種別, ログ文言)。None はワーカー停止の合図
+        self._mail_q: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self._mail_thread: Optional[threading.Thread] = None
+        # 送信待ちのアラート（履歴ID → 地点名）。送信前の地点を次のサイクルで重ねて積まないため
+        self._pending: Dict[int, str] = {}
+        self._pending_lock = threading.Lock()
+        self._drain_registered = False
+    
+    @staticmethod
+    def _create_mailer(cfg: Dict[str, Any]) -> Optional[OutlookMailer]:
         if WINDOWS_EMAIL and cfg["notification"].get("outlook", {}).get("enabled", True):
-            self.mailer = OutlookMailer(
+            return OutlookMailer(
                 importance=cfg["notification"]["outlook"].get("importance", "Normal")
             )
+        return None
+    
+    def update_config(self, cfg: Dict[str, Any], db_path: str) -> None:
+        """再読み込みした設定を反映（送信済みの状態は引き継ぐ）"""
+        if cfg["notification"].get("outlook") != self.cfg["notification"].get("outlook"):
+            self.mailer = self._create_mailer(cfg)
+        self.cfg = cfg
+        self.db_path = db_path
+    
+    def _enqueue_mail(self, point_name: str, recipients: str, subject: str, body: str,
+                      history_id: int, noti_type: str, log_text: str) -> None:
+        """メールを送信キューに積む（ワーカーは初回に起動）"""
+        if self._mail_thread is None or not self._mail_thread.is_alive():
+            self._mail_thread = threading.Thread(target=self._mail_worker, name="mail-worker", daemon=True)
+            self._mail_thread.start()
+            if not self._drain_registered:
+                # プロセス終了時も送信待ちのメールを取りこぼさない
+                atexit.register(self.drain, self.MAIL_DRAIN_TIMEOUT)
+                self._drain_registered = True
+        with self._pending_lock:
+            self._pending[history_id] = point_name
+        self._mail_q.put((self.mailer, recipients, subject, body, history_id, noti_type, log_text))
+    
+    def _mail_worker(self) -> None:
+        """送信キューのメールを順に送信"""
+        while True:
+            item = self._mail_q.get()
+            try:
+                if item is None:
+                    return
+                mailer, recipients, subject, body, history_id, noti_type, log_text = item
+                sent = mailer.send(recipients, subject, body)
+                # 送信済みの履歴だけがクールダウンの対象（失敗したものは次のサイクルで改めて判定される）
+                mark_notification_status(self.db_path, history_id, sent)
+                if sent:
+                    log_message(f"{log_text}: {recipients}")
+                elif noti_type == "admin_heartbeat":
+                    self._last_heartbeat_sent = None
+            except Exception as e:
+                log_message(f"[ERROR] メール送信キュー処理失敗: {e}")
+            finally:
+                if item is not None:
+                    with self._pending_lock:
+                        self._pending.pop(item[4], None)
+                self._mail_q.task_done()
+    
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """送信待ちのメールを送り切ってワーカーを止める（1回実行の終了時など）"""
+        if self._mail_thread is None:
+            return
+        self._mail_q.put(None)
+        self._mail_thread.join(timeout)
+        self._mail_thread = None
+    
+    def load_cooldown_points(self) -> Set[str]:
+        """
+        クールダウン中の地点名（送信済みの履歴＋送信待ちのアラート）
+        
+        送信待ちを先に取り出してからDBを見る。送信スレッドは履歴を更新してから送信待ちを外すため、
+        この順なら送信中のアラートがどちらにも含まれない瞬間がない。
+        """
+        with self._pending_lock:
+            points = set(self._pending.values())
+        cooldown = self.cfg["notification"].get("cooldown_minutes", 30)
+        return points | recent_notification_points(self.db_path, cooldown)
     
     def check_and_notify(self, point_name: str, location_cfg: Dict[str, Any], 
-                         forecasts: Dict[int, float]):
-        """閾値超過チェックと通知"""
+                         forecasts: Dict[int, float],
+                         cooldown_points: Optional[Set[str]] = None):
+        """
+        閾値超過チェックと通知
+        
+        Args:
+            cooldown_points: クールダウン中の地点名（省略時は load_cooldown_points() で取得。送信した地点は追加される）
+        """
         
         # 地点が無効な場合はスキップ
         if not location_cfg.get("enabled", True):
@@ -391,7 +596,9 @@ class NotificationManager:
             
         # クールダウンチェック
         cooldown = self.cfg["notification"].get("cooldown_minutes", 30)
-        if check_recent_notification(self.db_path, point_name, cooldown):
+        if cooldown_points is None:
+            cooldown_points = self.load_cooldown_points()
+        if point_name in cooldown_points:
             log_message(f"[{point_name}] 通知クールダウン中（{cooldown}分）")
             return
         
@@ -455,13 +662,14 @@ class NotificationManager:
 次回通知まで最低{cooldown}分のクールダウン期間があります。
 """
         
-        # 送信
-        if self.mailer.send(recipients, subject, body):
-            save_notification_history(
-                self.db_path, point_name, "threshold_alert",
-                recipients, subject, body, max_mmph, threshold_type
-            )
-            log_message(f"[通知] {point_name} へアラート送信: {recipients}")
+        # 送信（履歴は送信待ちとして先に保存し、送信結果で更新する）
+        history_id = save_notification_history(
+            self.db_path, point_name, "threshold_alert",
+            recipients, subject, body, max_mmph, threshold_type, status="pending"
+        )
+        cooldown_points.add(point_name)
+        self._enqueue_mail(point_name, recipients, subject, body, history_id, "threshold_alert",
+                           f"[通知] {point_name} へアラート送信")
     
     def send_admin_heartbeat(self):
         """管理者への定期通知"""
@@ -477,36 +685,41 @@ class NotificationManager:
         if current_time not in notification_times:
             return
         
-        # 既に送信済みかチェック（1時間以内）
-        with sqlite3.connect(self.db_path) as con:
-            cutoff = (now - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
-            cur = con.execute("""
-                SELECT COUNT(*) FROM notification_history
-                WHERE notification_type = 'admin_heartbeat' AND datetime(sent_at) > datetime(?)
-            """, (cutoff,))
-            if cur.fetchone()[0] > 0:
-                return
-        
-        # 稼働状況を集計
-        with sqlite3.connect(self.db_path) as con:
-            # 直近1時間のデータ数
-            hour_ago = (now - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
-            cur = con.execute("""
-                SELECT point_name, COUNT(*) as cnt, MAX(mmph) as max_mmph
-                FROM nowcast 
-                WHERE datetime(created_at) > datetime(?)
-                GROUP BY point_name
-            """, (hour_ago,))
-            location_stats = {row[0]: {"count": row[1], "max": row[2]} for row in cur.fetchall()}
-            
-            # 直近24時間のアラート数
-            day_ago = (now - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S")
-            cur = con.execute("""
-                SELECT COUNT(*) as cnt
-                FROM notification_history
-                WHERE notification_type = 'threshold_alert' AND datetime(sent_at) > datetime(?)
-            """, (day_ago,))
-            alerts_24h = cur.fetchone()[0]
+        # 既に送信済みかチェック（1時間以内）。常駐中は記憶している送信時刻で判定し、
+        # DBは再起動直後など記憶がないときだけ確認する
+        if self._last_heartbeat_sent and now - self._last_heartbeat_sent < timedelta(hours=1):
+            return
+        
+        # 送信済み件数・地点別の収集状況・24時間のアラート数を1回の問い合わせで取得
+        # （created_at / sent_at はUTCで保存されているため、基準時刻もSQL側で求める）
+        con = _get_conn(self.db_path)
+        cur = con.execute("""
+            SELECT 'hb' AS tag, NULL, COUNT(*), NULL
+            FROM notification_history
+            WHERE notification_type = 'admin_heartbeat' AND status = 'sent' AND sent_at > datetime('now', '-1 hours')
+            UNION ALL
+            SELECT 'alerts24h', NULL, COUNT(*), NULL
+            FROM notification_history
+            WHERE notification_type = 'threshold_alert' AND status = 'sent' AND sent_at > datetime('now', '-24 hours')
+            UNION ALL
+            SELECT 'stats', point_name, COUNT(*), MAX(mmph)
+            FROM nowcast
+            WHERE created_at > datetime('now', '-1 hours')
+            GROUP BY point_name
+        """)
+        location_stats = {}
+        heartbeats_1h = alerts_24h = 0
+        for tag, name, cnt, max_mmph in cur:
+            if tag == "hb":
+                heartbeats_1h = cnt
+            elif tag == "alerts24h":
+                alerts_24h = cnt
+            else:
+                location_stats[name] = {"count": cnt, "max": max_mmph}
+        
+        # 既に送信済み（再起動直後など）
+        if heartbeats_1h > 0:
+            return
         
         # メール作成
         subject = f"[降水監視] 定期稼働レポート - {now.strftime('%Y-%m-%d %H:%M')}"
@@ -553,13 +766,14 @@ class NotificationManager:
 システムは正常に稼働しています。
 """
         
-        # 送信
-        if self.mailer.send(admin_email, subject, body):
-            save_notification_history(
-                self.db_path, "ADMIN", "admin_heartbeat",
-                admin_email, subject, body
-            )
-            log_message(f"[管理者通知] 定期レポート送信: {admin_email}")
+        # 送信（履歴は送信待ちとして先に保存し、送信結果で更新する）
+        history_id = save_notification_history(
+            self.db_path, "ADMIN", "admin_heartbeat",
+            admin_email, subject, body, status="pending"
+        )
+        self._last_heartbeat_sent = now
+        self._enqueue_mail("ADMIN", admin_email, subject, body, history_id, "admin_heartbeat",
+                           "[管理者通知] 定期レポート送信")
 
 # ───────── ユーティリティ ─────────
 def log_message(msg: str, also_print=True):
@@ -583,24 +797,39 @@ def write_heartbeat(ok: bool, error: str = ""):
     except Exception as e:
         log_message(f"[WARN] ハートビート書き込み失敗: {e}")
 
+# 設定ファイルの読み込み結果（パスと更新時刻が変わらない限り使い回す）
+_CFG_CACHE: Dict[str, Any] = {"key": None, "cfg": None}
+
 def load_config(path="config.json") -> Dict[str, Any]:
+    """設定ファイルを読み込み、既定値にユーザー設定を上書きマージして返す"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    key = (os.path.abspath(path), mtime)
+    if _CFG_CACHE["key"] == key:
+        return _CFG_CACHE["cfg"]
+    
     try:
         with open(path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
+            user_cfg = json.load(f)
     except Exception:
-        cfg = {}
-    
-    def deepmerge(a, b):
-        for k, v in b.items():
-            if isinstance(v, dict):
-                a[k] = deepmerge(a.get(k, {}), v)
-            elif isinstance(v, list):
-                a.setdefault(k, v)
+        user_cfg = {}
+    
+    # 既定値は毎回複製し、戻り値の変更が DEFAULT_CONFIG に波及しないようにする
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    stack = [(cfg, user_cfg)]
+    while stack:
+        dst, src = stack.pop()
+        for k, v in src.items():
+            if isinstance(v, dict) and isinstance(dst.get(k), dict):
+                stack.append((dst[k], v))
             else:
-                a.setdefault(k, v)
-        return a
+                dst[k] = v
     
-    return deepmerge(cfg, DEFAULT_CONFIG.copy())
+    _CFG_CACHE["key"] = key
+    _CFG_CACHE["cfg"] = cfg
+    return cfg
 
 # ───────── JMA Nowcast API ─────────
 """
@@ -639,17 +868,27 @@ class JMANowcastAPI:
     - キャッシュによるパフォーマンス最適化
     """
     BASE = "https://www.jma.go.jp/bosai/jmatile/data/nowc"
+    FETCH_WORKERS = 16      # タイル並行取得のスレッド数
+    TILE_CACHE_SIZE = 128   # 保持するタイル数（1枚あたり RGBA+パレット番号で約320KB）
     
     def __init__(self, zoom=10):
         self.zoom = zoom
         self.session = requests.Session()
         self.session.headers.update({"User-Agent": "rain-monitor/2.0"})
-        if Retry:
-            adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.5, 
-                                                    status_forcelist=(429,500,502,503,504)))
-            self.session.mount("https://", adapter)
-            self.session.mount("http://", adapter)
+        # 並行取得に合わせて接続プールを広げる（既定の10では接続が使い回されず張り直しになる）
+        retries = Retry(total=3, backoff_factor=0.5,
+                        status_forcelist=(429,500,502,503,504)) if Retry else 0
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retries)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self._cache: Dict[str, Dict[str, Any]] = {}
+        # (basetime, validtime, x, y) → (RGBA配列, パレット番号配列, URL)。収集サイクルをまたいで保持（LRU）
+        self._tiles: "OrderedDict[Tuple[str, str, int, int], Tuple[np.ndarray, Optional[np.ndarray], str]]" = OrderedDict()
+        # 直近の prefetch_tiles で取得に失敗したタイル（次のサイクルでは再取得する）
+        self._tile_errors: Dict[Tuple[str, str, int, int], Exception] = {}
+        self._basetimes: Set[str] = set()
+        # basetime ごとに取得できたURLパターンの番号（以降のタイルはそのパターンから試す）
+        self._pattern_by_basetime: Dict[str, int] = {}
 
     def _get_target_times(self, kind: str):
         """targetTimes取得（60秒キャッシュ）"""
@@ -689,52 +928,47 @@ class JMANowcastAPI:
         if n1:
             result[0] = (n1[0]["basetime"], n1[0]["validtime"])
         
-        # N2取得（lead>0用）
+        # N2取得（lead>0用）。validtime（UTC）は一度だけ解析し、昇順に並べて二分探索する
+        # （同じ validtime が複数あれば n2 の並びで先のものを優先）
         n2 = self._normalize(self._get_target_times("N2"))
+        n2_dts = [datetime.strptime(item["validtime"], "%Y%m%d%H%M%S") for item in n2]
+        order = sorted(range(len(n2)), key=n2_dts.__getitem__)
+        sorted_dts = [n2_dts[i] for i in order]
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
         
         for lead in leads:
-            if lead == 0:
-                continue  # 既にN1で処理済み
+            if lead == 0 or not n2:
+                continue  # lead=0 は既にN1で処理済み
                 
-            # 現在時刻からleadを足した時刻に最も近いvalidtimeを選択
-            target_jst = datetime.now(JST) + timedelta(minutes=lead)
-            target_utc = (target_jst - timedelta(hours=9)).strftime("%Y%m%d%H%M%S")
-            
-            best_match = None
-            min_diff = float('inf')
-            
-            for item in n2:
-                vt = item["validtime"]
-                vt_dt = datetime.strptime(vt, "%Y%m%d%H%M%S")
-                target_dt = datetime.strptime(target_utc, "%Y%m%d%H%M%S")
-                diff = abs((vt_dt - target_dt).total_seconds())
-                
-                if diff < min_diff:
-                    min_diff = diff
-                    best_match = item
-            
-            if best_match:
-                result[lead] = (best_match["basetime"], best_match["validtime"])
+            # 現在時刻からleadを足した時刻に最も近いvalidtimeを選択（前後の候補を比べる）
+            target_dt = now_utc + timedelta(minutes=lead)
+            j = bisect.bisect_left(sorted_dts, target_dt)
+            candidates = []
+            if j > 0:
+                candidates.append(order[bisect.bisect_left(sorted_dts, sorted_dts[j - 1])])
+            if j < len(order):
+                candidates.append(order[j])
+            best = min(candidates, key=lambda i: (abs((n2_dts[i] - target_dt).total_seconds()), i))
+            result[lead] = (n2[best]["basetime"], n2[best]["validtime"])
+        
+        # 新しい basetime が出たら古いタイルはもう参照されないので破棄
+        basetimes = {bt for bt, _ in result.values()}
+        if basetimes != self._basetimes:
+            self._tiles.clear()
+            self._basetimes = basetimes
+            self._pattern_by_basetime = {bt: i for bt, i in self._pattern_by_basetime.items()
+                                         if bt in basetimes}
         
         return result
 
-    def _deg2tile(self, lat, lon):
-        z = self.zoom
-        lat_rad = math.radians(lat)
-        n = 2.0**z
-        xtile = int((lon + 180.0) / 360.0 * n)
-        ytile = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
-        return xtile, ytile
-
-    def _pixel_in_tile(self, lat, lon):
-        z = self.zoom
-        lat_rad = math.radians(lat)
-        n = 2.0**z
+    def _project(self, lat, lon) -> Tuple[int, int, int, int]:
+        """緯度経度 → (タイルX, タイルY, タイル内ピクセルX, タイル内ピクセルY)"""
+        n = 2.0**self.zoom
         fx = (lon + 180.0) / 360.0 * n
-        fy = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
-        px = int((fx - math.floor(fx)) * 256)
-        py = int((fy - math.floor(fy)) * 256)
-        return px, py
+        fy = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+        xtile = math.floor(fx)
+        ytile = math.floor(fy)
+        return xtile, ytile, int((fx - xtile) * 256), int((fy - ytile) * 256)
 
     def _fetch_tile_png(self, basetime, validtime, x, y):
         patterns = [
@@ -742,11 +976,18 @@ class JMANowcastAPI:
             f"{self.BASE}/{basetime}/{validtime}/surf/hrpns/{self.zoom}/{x}/{y}.png",
             f"{self.BASE}/{basetime}/none/{validtime}/surf/rasrf/{self.zoom}/{x}/{y}.png",
         ]
+        order = list(range(len(patterns)))
+        known = self._pattern_by_basetime.get(basetime)
+        if known is not None:
+            order.remove(known)
+            order.insert(0, known)
         last_err = None
-        for url in patterns:
+        for i in order:
+            url = patterns[i]
             try:
                 r = self.session.get(url, timeout=10)
                 if r.status_code == 200:
+                    self._pattern_by_basetime[basetime] = i
                     return Image.open(BytesIO(r.content)), url
                 elif r.status_code == 404:
                     continue
@@ -756,41 +997,91 @@ class JMANowcastAPI:
                 last_err = str(e)
         raise RuntimeError(f"タイル取得失敗: {last_err}")
 
-    @staticmethod
-    def _alpha_at(img: Image.Image, x: int, y: int) -> int:
-        return (img if img.mode == 'RGBA' else img.convert('RGBA')).getchannel('A').getpixel((x, y))
-
-    @staticmethod
-    def _rgb_at(img: Image.Image, x: int, y: int) -> Tuple[int, int, int]:
-        return (img if img.mode == 'RGB' else img.convert('RGB')).getpixel((x, y))
+    def _fetch_tile(self, basetime, validtime, x, y) -> Tuple[np.ndarray, Optional[np.ndarray], str]:
+        """タイルを取得して配列に変換（並行取得のスレッドからも呼ばれる）"""
+        img, url = self._fetch_tile_png(basetime, validtime, x, y)
+        rgba, idx = self._tile_arrays(img)
+        return rgba, idx, url
 
-    def _calc_step_at(self, img: Image.Image, x: int, y: int) -> int:
-        a = self._alpha_at(img, x, y)
-        if a == 0:
+    def prefetch_tiles(self, points: Iterable[Tuple[float, float]],
+                       times: Iterable[Tuple[str, str]]) -> int:
+        """
+        全地点×全時刻のタイルを重複なく並行取得してキャッシュ
+        
+        近い地点は同じタイルを共有するため、取得は一意なタイルの数だけ行う。
+        取得済みのタイル（前回サイクルで同じ basetime/validtime のもの）は取得しない。
+        失敗したタイルは例外を記録し、rainfall_mm_at で地点ごとに報告する。
+        
+        Returns:
+            新たに取得したタイル数
+        """
+        self._tile_errors.clear()
+        times = list(times)
+        keys = {(bt, vt) + self._project(lat, lon)[:2] for lat, lon in points for bt, vt in times}
+        keys = [k for k in keys if k not in self._tiles]
+        if not keys:
             return 0
-        if img.mode == 'P':
-            return int(img.getpixel((x, y)))
-        return 1
+        with ThreadPoolExecutor(max_workers=min(self.FETCH_WORKERS, len(keys))) as ex:
+            futures = {key: ex.submit(self._fetch_tile, *key) for key in keys}
+        for key, fut in futures.items():
+            try:
+                self._store_tile(key, fut.result())
+            except Exception as e:
+                self._tile_errors[key] = e
+        return len(keys)
+
+    def _store_tile(self, key: Tuple[str, str, int, int],
+                    tile: Tuple[np.ndarray, Optional[np.ndarray], str]) -> None:
+        """タイルをキャッシュに追加し、上限を超えたら最も古く使われたものから捨てる"""
+        self._tiles[key] = tile
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.TILE_CACHE_SIZE:
+            self._tiles.popitem(last=False)
+
+    def _get_tile(self, basetime, validtime, x, y) -> Tuple[np.ndarray, Optional[np.ndarray], str]:
+        """キャッシュ済みのタイルを返す（未取得ならここで取得）"""
+        key = (basetime, validtime, x, y)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+        if key in self._tile_errors:
+            raise self._tile_errors[key]
+        tile = self._fetch_tile(*key)
+        self._store_tile(key, tile)
+        return tile
 
-    def _calc_step_in_window(self, img: Image.Image, px: int, py: int, size: int = 2) -> int:
-        w, h = img.size
+    @staticmethod
+    def _tile_arrays(img: Image.Image) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        タイル画像を一度だけ配列に変換
+        
+        Returns:
+            (RGBA配列 H×W×4, パレット番号配列 H×W ※パレット画像以外は None)
+        """
+        # 既にRGBAなら convert による画像全体の複製を省く
+        rgba = np.asarray(img if img.mode == 'RGBA' else img.convert('RGBA'))
+        idx = np.asarray(img) if img.mode == 'P' else None
+        return rgba, idx
+
+    @staticmethod
+    def _calc_step_in_window(rgba: np.ndarray, idx: Optional[np.ndarray],
+                             px: int, py: int, size: int = 2) -> int:
+        """
+        窓内の最大ステップ値（透明な画素は0、パレット画像はパレット番号、それ以外は1）
+        """
+        h, w = rgba.shape[:2]
         half = size // 2
         sx = max(0, min(px - (half - 1), w - size))
         sy = max(0, min(py - (half - 1), h - size))
-        m = 0
-        for dx in range(size):
-            for dy in range(size):
-                x = sx + dx
-                y = sy + dy
-                s = self._calc_step_at(img, x, y)
-                if s > m:
-                    m = s
-        return m
+        alpha = rgba[sy:sy + size, sx:sx + size, 3]
+        if idx is None:
+            return int(alpha.max() > 0)
+        return int(_palette_window_max(alpha, idx[sy:sy + size, sx:sx + size]))
 
     def rainfall_mm_at(self, lat: float, lon: float, basetime: str, validtime: str, method="max_2x2"):
-        xt, yt = self._deg2tile(lat, lon)
-        px, py = self._pixel_in_tile(lat, lon)
-        img, url = self._fetch_tile_png(basetime, validtime, xt, yt)
+        xt, yt, px, py = self._project(lat, lon)
+        rgba, idx, url = self._get_tile(basetime, validtime, xt, yt)
 
         # step 推定
         if method == "max_3x3":
@@ -801,14 +1092,13 @@ class JMANowcastAPI:
             size = 8
         else:
             size = 2
-        step = self._calc_step_in_window(img, px, py, size=size)
+        step = self._calc_step_in_window(rgba, idx, px, py, size=size)
 
         # 色→代表値（優先）、ダメなら step→bins
-        a = self._alpha_at(img, px, py)
+        r, g, b, a = rgba[py, px].tolist()
         if a == 0:
             mmh = 0.0
         else:
-            r, g, b = self._rgb_at(img, px, py)
             mmh_color = near_color_to_mmh(r, g, b, tol=2)
             mmh = mmh_color if (mmh_color is not None) else convert_step_to_mmh_jma_bins(step)
 
@@ -841,12 +1131,15 @@ class JMANowcastAPI:
    - ログの出力
 """
 
-def run_once(cfg: Dict[str, Any]) -> None:
+def run_once(cfg: Dict[str, Any], api: Optional[JMANowcastAPI] = None,
+             notifier: Optional[NotificationManager] = None) -> None:
     """
     1回分のデータ収集と監視を実行
     
     Args:
         cfg: システム設定辞書
+        api: 使い回すAPIクライアント（省略時は新規作成。常駐時はタイルキャッシュを引き継ぐため渡す）
+        notifier: 使い回す通知マネージャー（省略時は新規作成。常駐時は送信済みの状態を引き継ぐため渡す）
         
     処理内容:
     1. ログ設定の適用
@@ -861,11 +1154,15 @@ def run_once(cfg: Dict[str, Any]) -> None:
     ensure_db(sqlite_path)
     purge_old_rows(sqlite_path, int(cfg["storage"].get("retention_days", 3)))
 
-    api = JMANowcastAPI(zoom=10)
+    if api is None:
+        api = JMANowcastAPI(zoom=10)
     leads = sorted(set(cfg.get("leads") or [0, 15, 30, 45, 60]))
     
-    # 通知マネージャー初期化
-    notifier = NotificationManager(cfg, sqlite_path)
+    # 通知マネージャー初期化（渡されたものは最新の設定に更新して使う）
+    if notifier is None:
+        notifier = NotificationManager(cfg, sqlite_path)
+    else:
+        notifier.update_config(cfg, sqlite_path)
     
     # 管理者への定期通知チェック
     notifier.send_admin_heartbeat()
@@ -877,10 +1174,27 @@ def run_once(cfg: Dict[str, Any]) -> None:
         log_message("[WARN] targetTimesが空のためスキップ")
         return
     
+    if _STOP.is_set():
+        return
+    
+    # 全地点・全リードのタイルを先にまとめて並行取得（地点間で共有されるタイルは1回だけ）
+    enabled_locations = [loc for loc in cfg.get("locations", []) if loc.get("enabled", True)]
+    api.prefetch_tiles(((float(loc["lat"]), float(loc["lon"])) for loc in enabled_locations),
+                       times_for_leads.values())
+    
+    # 観測データは全地点分をまとめて最後に1回で保存する
+    rows: List[Tuple] = []
+    
+    # クールダウン中の地点は1回の問い合わせでまとめて取得しておく
+    cooldown_points: Set[str] = set()
+    if cfg["notification"]["enabled"]:
+        cooldown_points = notifier.load_cooldown_points()
+    
     # 各地点を処理
-    for loc in cfg.get("locations", []):
-        if not loc.get("enabled", True):
-            continue
+    for loc in enabled_locations:
+        if _STOP.is_set():
+            log_message("停止要求のため収集を中断します")
+            break
             
         name = loc.get("name", "(無名)")
         lat = float(loc["lat"])
@@ -898,7 +1212,7 @@ def run_once(cfg: Dict[str, Any]) -> None:
             
             try:
                 mmh, vt_jst, url, step = api.rainfall_mm_at(lat, lon, bt, vt, method="max_2x2")
-                save_nowcast(sqlite_path, name, lat, lon, bt, vt, lead, mmh)
+                rows.append(nowcast_row(name, lat, lon, bt, vt, lead, mmh))
                 forecasts[lead] = mmh
                 saved += 1
                 
@@ -907,13 +1221,16 @@ def run_once(cfg: Dict[str, Any]) -> None:
                 log_message(f"[{name}] {time_str}: {mmh:.1f} mm/h (validtime: {vt_jst.strftime('%H:%M')})")
                 
             except Exception as e:
-                log_message(f"[WARN] {name} {lead}分後 保存失敗: {e}")
+                log_message(f"[WARN] {name} {lead}分後 取得失敗: {e}")
         
-        log_message(f"[{name}] 保存完了: {saved}/{len(leads)} 件")
+        log_message(f"[{name}] 取得完了: {saved}/{len(leads)} 件")
         
         # 閾値チェックと通知
         if cfg["notification"]["enabled"] and forecasts:
-            notifier.check_and_notify(name, loc, forecasts)
+            notifier.check_and_notify(name, loc, forecasts, cooldown_points)
+    
+    save_nowcast(sqlite_path, rows)
+    log_message(f"保存完了: {len(rows)} 件")
     
     write_heartbeat(True, "")
 
@@ -972,25 +1289,84 @@ def main():
         f.write(str(os.getpid()))
 
     if args.once:
-        run_once(cfg)
+        notifier = NotificationManager(cfg, cfg["storage"]["sqlite_path"])
+        try:
+            run_once(cfg, notifier=notifier)
+        finally:
+            notifier.drain(NotificationManager.MAIL_DRAIN_TIMEOUT)
         return
 
-    while True:
+    try:
+        asyncio.run(_scheduler(args.config))
+    except KeyboardInterrupt:
+        print("\nKeyboardInterrupt: 終了します。")
+
+# Ctrl+C などで常駐ループを止めるときに立てる（収集スレッドは地点の区切りで確認して中断する）
+_STOP = threading.Event()
+
+def _run_in_thread(fn, *args) -> "asyncio.Future":
+    """
+    fn をデーモンスレッドで実行し、結果を待てる Future を返す
+    
+    実行中の収集が終わるのを待たずにプロセスを終了できるよう、
+    終了時に join されるスレッドプールではなくデーモンスレッドを使う
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    
+    def settle(result, exc):
+        if fut.done():
+            return  # 停止時にキャンセル済み
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+    
+    def target():
+        result, exc = None, None
         try:
-            cfg = load_config(args.config)
-            if cfg["monitoring"]["enabled"]:
-                run_once(cfg)
-                time.sleep(int(cfg["monitoring"]["interval_minutes"]) * 60)
-            else:
-                log_message("monitoring.enabled=False のため待機中")
-                time.sleep(60)
-        except KeyboardInterrupt:
-            print("\nKeyboardInterrupt: 終了します。")
-            break
+            result = fn(*args)
         except Exception as e:
-            log_message(f"[ERROR] ループエラー: {e}")
-            write_heartbeat(False, str(e))
-            time.sleep(60)
+            exc = e
+        try:
+            loop.call_soon_threadsafe(settle, result, exc)
+        except RuntimeError:
+            pass  # イベントループは既に終了している
+    
+    threading.Thread(target=target, name="collector", daemon=True).start()
+    return fut
+
+async def _scheduler(config_path: str) -> None:
+    """
+    常駐ループ
+    
+    収集（run_once）と次回までの待機を並行させ、収集にかかった時間に関係なく
+    interval_minutes ごとに開始する。収集はデーモンスレッドで行い、停止時はその完了を待たない
+    （Outlook COM はメール送信スレッドが持つため、収集スレッドはサイクルごとに変わってよい）。
+    """
+    # セッション（接続プール）とタイルキャッシュ、通知の送信状態はサイクルをまたいで使い回す
+    api = JMANowcastAPI(zoom=10)
+    notifier: Optional[NotificationManager] = None
+    try:
+        while True:
+            try:
+                cfg = load_config(config_path)
+                if cfg["monitoring"]["enabled"]:
+                    if notifier is None:
+                        notifier = NotificationManager(cfg, cfg["storage"]["sqlite_path"])
+                    await asyncio.gather(
+                        _run_in_thread(run_once, cfg, api, notifier),
+                        asyncio.sleep(int(cfg["monitoring"]["interval_minutes"]) * 60),
+                    )
+                else:
+                    log_message("monitoring.enabled=False のため待機中")
+                    await asyncio.sleep(60)
+            except Exception as e:
+                log_message(f"[ERROR] ループエラー: {e}")
+                write_heartbeat(False, str(e))
+                await asyncio.sleep(60)
+    finally:
+        _STOP.set()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file